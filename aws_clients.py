@@ -0,0 +1,46 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "32"))
+AWS_TCP_KEEPALIVE = os.environ.get("AWS_TCP_KEEPALIVE", "true").lower() == "true"
+
+# boto3 clients are thread safe, sessions are not: one session is shared and only touched under the lock.
+# This module is imported once per streamlit server process, so the registry survives reruns and is
+# shared by every browser session.
+_lock = threading.Lock()
+_session = boto3.session.Session()
+_clients = {}
+
+
+def get_client(service_name: str, endpoint_url: str, region_name: str = None):
+    key = (service_name, endpoint_url, region_name)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _session.client(service_name,
+                                     endpoint_url=endpoint_url,
+                                     region_name=region_name,
+                                     config=Config(max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+                                                   tcp_keepalive=AWS_TCP_KEEPALIVE))
+            metrics.instrument(client)
+            # the endpoint changed: the clients built for the previous one are dropped
+            for stale_key in [k for k in _clients if k[0] == service_name and k[1] != endpoint_url]:
+                del _clients[stale_key]
+            _clients[key] = client
+        return client
+
+
+def clear_clients():
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,272 @@
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# the application modules read their configuration from the environment when they are imported: everything
+# points to the in-process server below before any of them is loaded
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+DATASETS = {
+    "small": {"objects": 10, "secrets": 1, "large_object_mb": 16},
+    "medium": {"objects": 10_000, "secrets": 500, "large_object_mb": 64},
+    "large": {"objects": 500_000, "secrets": 5_000, "large_object_mb": 256},
+}
+# the bulk of the objects is small, so that the large dataset fits in the server's memory (moto keeps the bodies
+# under 16 MB in memory); each larger size class has a fixed number of objects whatever the dataset
+OBJECT_SIZES = (256, 1024)
+LARGE_OBJECT_SIZES = (64 * 1024, 1024 * 1024)
+LARGE_OBJECTS_PER_SIZE = 10
+SEED_MAX_WORKERS = 32
+BUCKET_NAME = "bench-bucket"
+SYNC_BUCKET_NAME = "bench-sync-bucket"
+SCRATCH_BUCKET_NAME = "bench-scratch-bucket"
+SCRATCH_OBJECTS = 2000
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(work_dir: str):
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        sys.exit("moto is required to run the benchmarks: pip install -r benchmarks/requirements.txt")
+    port = _free_port()
+    endpoint_url = f"http://127.0.0.1:{port}"
+    os.environ.update({"AWS_ACCESS_KEY_ID": "benchmark", "AWS_SECRET_ACCESS_KEY": "benchmark",
+                       "AWS_DEFAULT_REGION": "us-east-1",
+                       "AWS_S3_CUSTOM_ENDPOINT_URL": endpoint_url, "AWS_SM_CUSTOM_ENDPOINT_URL": endpoint_url,
+                       "AWS_S3_INDEX_PATH": os.path.join(work_dir, "s3_index.sqlite3")})
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    return server
+
+
+def seed(dataset: dict):
+    import s3_svc
+    import secrets_manager_svc
+
+    client = s3_svc._client()
+    for bucket_name in (BUCKET_NAME, SYNC_BUCKET_NAME, SCRATCH_BUCKET_NAME):
+        s3_svc.create_bucket(bucket_name)
+    payloads = {size: os.urandom(size) for size in OBJECT_SIZES + LARGE_OBJECT_SIZES}
+    # the size does not depend on the folder: every folder, data/00/ (the downloads) included, mixes the sizes
+    objects = [(f"data/{i % 100:02d}/{i:07d}.bin", OBJECT_SIZES[(i // 100) % len(OBJECT_SIZES)])
+               for i in range(dataset["objects"])]
+    objects += [(f"data/{n % 100:02d}/large-{size}-{n:02d}.bin", size)
+                for size in LARGE_OBJECT_SIZES for n in range(LARGE_OBJECTS_PER_SIZE)]
+    with ThreadPoolExecutor(max_workers=SEED_MAX_WORKERS) as executor:
+        list(executor.map(lambda obj: client.put_object(Bucket=BUCKET_NAME, Key=obj[0], Body=payloads[obj[1]]),
+                          objects))
+        client.put_object(Bucket=BUCKET_NAME, Key="preview/sample.json", Body=json.dumps({"a": 1}).encode())
+        list(executor.map(lambda i: secrets_manager_svc.upsert_secret(f"bench/secret-{i:05d}", f"value-{i}"),
+                          range(dataset["secrets"])))
+    s3_svc.upload_fileobj(BUCKET_NAME, "large/object.bin", io.BytesIO(os.urandom(dataset["large_object_mb"] << 20)))
+
+
+def seed_scratch_objects(bucket_name: str, objects_count: int = SCRATCH_OBJECTS):
+    import s3_svc
+
+    client = s3_svc._client()
+    with ThreadPoolExecutor(max_workers=SEED_MAX_WORKERS) as executor:
+        list(executor.map(lambda i: client.put_object(Bucket=bucket_name, Key=f"scratch/{i:05d}", Body=b"x"),
+                          range(objects_count)))
+
+
+def benchmark_cases(dataset: dict, work_dir: str, include_pages: bool) -> list:
+    # (name, setup or None, timed function)
+    import s3_index
+    import s3_svc
+    import secrets_manager_svc
+
+    def fresh_dir(name: str) -> str:
+        path = os.path.join(work_dir, name)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    large_object_bytes = os.urandom(dataset["large_object_mb"] << 20)
+    small_files = [os.urandom(1 << 20) for _ in range(20)]
+    import_payload = {f"bench/import-{i:04d}": f"value-{i}" for i in range(100)}
+
+    cases = [
+        ("s3.list_buckets", None, s3_svc.list_buckets),
+        ("s3.first_object_page", None, lambda: next(s3_svc.iter_object_pages(BUCKET_NAME, max_keys=1000))),
+        ("s3.list_objects", None, lambda: s3_svc.list_objects(BUCKET_NAME)),
+        ("s3.summarize_bucket", None, lambda: s3_svc.summarize_bucket(BUCKET_NAME)),
+        ("s3.head_object", None, lambda: s3_svc.head_object(BUCKET_NAME, "large/object.bin")),
+        ("s3.get_object_tags", None, lambda: s3_svc.get_object_tags(BUCKET_NAME, "large/object.bin")),
+        ("s3.get_object_range", None, lambda: s3_svc.get_object_range(BUCKET_NAME, "large/object.bin")),
+        ("s3.get_object", None, lambda: s3_svc.get_object(BUCKET_NAME, "preview/sample.json")["Body"].read()),
+        ("s3.write_object", None, lambda: s3_svc.write_object(BUCKET_NAME, "bench/write.bin", b"x" * 1024)),
+        ("s3.upload_fileobj", None,
+         lambda: s3_svc.upload_fileobj(BUCKET_NAME, "bench/upload.bin", io.BytesIO(large_object_bytes))),
+        ("s3.upload_fileobjs", None,
+         lambda: list(s3_svc.upload_fileobjs(BUCKET_NAME, [(f"bench/many/{i}", io.BytesIO(data))
+                                                           for i, data in enumerate(small_files)]))),
+        ("s3.download_object", None,
+         lambda: s3_svc.download_object(BUCKET_NAME, "large/object.bin", os.path.join(work_dir, "object.bin"))),
+        ("s3.download_objects", None,
+         lambda: list(s3_svc.download_objects(BUCKET_NAME, fresh_dir("download"), prefix="data/00/"))),
+        ("s3.download_objects_zip", None,
+         lambda: list(s3_svc.download_objects_zip(BUCKET_NAME, os.path.join(work_dir, "objects.zip"),
+                                                  prefix="data/00/"))),
+        ("s3.sync_objects", lambda: list(s3_svc.delete_objects(SYNC_BUCKET_NAME, prefix="data/")),
+         lambda: list(s3_svc.sync_objects(BUCKET_NAME, SYNC_BUCKET_NAME, "data/", "data/"))),
+        ("s3.sync_objects_unchanged", None,
+         lambda: list(s3_svc.sync_objects(BUCKET_NAME, SYNC_BUCKET_NAME, "data/", "data/"))),
+        ("s3.delete_object", lambda: s3_svc.write_object(BUCKET_NAME, "bench/delete.bin", b"x"),
+         lambda: s3_svc.delete_object(BUCKET_NAME, "bench/delete.bin")),
+        ("s3.delete_objects", lambda: seed_scratch_objects(SCRATCH_BUCKET_NAME),
+         lambda: list(s3_svc.delete_objects(SCRATCH_BUCKET_NAME, prefix="scratch/"))),
+        ("s3.sync_bucket_index", None, lambda: s3_svc.sync_bucket_index(BUCKET_NAME)),
+        ("s3_index.search_objects", None, lambda: s3_index.search_objects(BUCKET_NAME, "*/42/*")),
+        ("s3_index.prefix_summary", None, lambda: s3_index.prefix_summary(BUCKET_NAME, "data/")),
+        ("s3.create_and_delete_bucket", None,
+         lambda: (s3_svc.create_bucket("bench-tmp-bucket"), s3_svc.delete_bucket("bench-tmp-bucket"))),
+        # as large as the dataset, and never less than a few pages of versions
+        ("s3.force_delete_bucket",
+         lambda: (s3_svc.create_bucket("bench-tmp-bucket"),
+                  seed_scratch_objects("bench-tmp-bucket", max(dataset["objects"], SCRATCH_OBJECTS))),
+         lambda: s3_svc.force_delete_bucket("bench-tmp-bucket")),
+        ("sm.first_secret_page", None, lambda: next(secrets_manager_svc.iter_secret_pages(max_results=100))),
+        ("sm.list_secrets", None, lambda: list(secrets_manager_svc.list_secrets())),
+        ("sm.count_secrets", None, secrets_manager_svc.count_secrets),
+        ("sm.upsert_secret", None, lambda: secrets_manager_svc.upsert_secret("bench/secret-00000", "updated")),
+        ("sm.describe_secret", None, lambda: secrets_manager_svc.describe_secret("bench/secret-00000")),
+        ("sm.get_secret_value", None, lambda: secrets_manager_svc.get_secret_value("bench/secret-00000")),
+        ("sm.delete_secret", lambda: secrets_manager_svc.upsert_secret("bench/delete", "value"),
+         lambda: secrets_manager_svc.delete_secret("bench/delete")),
+        ("sm.import_secrets", None, lambda: list(secrets_manager_svc.import_secrets(import_payload))),
+        ("sm.export_secrets", None, secrets_manager_svc.export_secrets),
+    ]
+    if include_pages:
+        for page_name, page_path in (("Home", "Home.py"), ("S3", "pages/S3.py"),
+                                     ("Secrets_Manager", "pages/Secrets_Manager.py"),
+                                     ("Overview", "pages/Overview.py")):
+            cases.append((f"page.{page_name}", None,
+                          lambda page_path=page_path: _run_page(os.path.join(REPO_ROOT, page_path))))
+    return cases
+
+
+def _run_page(page_path: str):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(page_path, default_timeout=600).run()
+    if app.exception:
+        raise RuntimeError(f"{page_path} raised {app.exception[0].value}")
+
+
+def run_cases(cases: list, repeat: int, only: str = None) -> dict:
+    from cache import CACHE
+
+    results = {}
+    for name, setup, func in cases:
+        if only and only not in name:
+            continue
+        timings = []
+        for _ in range(repeat):
+            if setup:
+                setup()
+            # every run measures the calls to the endpoint, not the response cache
+            CACHE.clear()
+            started_at = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started_at)
+        results[name] = {"median": statistics.median(timings), "min": min(timings), "runs": len(timings)}
+        print(f"{name:<32} median {results[name]["median"] * 1000:10.1f} ms   "
+              f"min {results[name]["min"] * 1000:10.1f} ms")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    print(f"\n{"benchmark":<32} {"baseline":>12} {"current":>12} {"change":>9}")
+    for name, result in results.items():
+        baseline_result = baseline.get("results", {}).get(name)
+        if baseline_result is None:
+            print(f"{name:<32} {"-":>12} {result["median"] * 1000:10.1f}ms {"new":>9}")
+            continue
+        change = result["median"] / baseline_result["median"] - 1 if baseline_result["median"] else 0.0
+        regressed = change > tolerance
+        print(f"{name:<32} {baseline_result["median"] * 1000:10.1f}ms {result["median"] * 1000:10.1f}ms "
+              f"{change:+8.0%}{" REGRESSION" if regressed else ""}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks s3_svc, secrets_manager_svc and the streamlit pages "
+                                                 "against an in-process moto server")
+    parser.add_argument("--dataset", choices=DATASETS.keys(), default="small")
+    parser.add_argument("--objects", type=int, help="number of seeded objects, overrides the dataset")
+    parser.add_argument("--secrets", type=int, help="number of seeded secrets, overrides the dataset")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", help="runs only the benchmarks whose name contains this text")
+    parser.add_argument("--skip-pages", action="store_true", help="does not run the page scripts with AppTest")
+    parser.add_argument("--output", default=os.path.join(REPO_ROOT, "benchmarks", "results.json"))
+    parser.add_argument("--baseline", default=os.path.join(REPO_ROOT, "benchmarks", "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="stores the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="a median slower than the baseline by more than this ratio is a regression")
+    args = parser.parse_args()
+
+    dataset = dict(DATASETS[args.dataset])
+    if args.objects is not None:
+        dataset["objects"] = args.objects
+    if args.secrets is not None:
+        dataset["secrets"] = args.secrets
+
+    work_dir = tempfile.mkdtemp(prefix="localstack_gui_bench_")
+    server = start_server(work_dir)
+    try:
+        print(f"seeding {dataset["objects"]} objects and {dataset["secrets"]} secrets...")
+        started_at = time.perf_counter()
+        seed(dataset)
+        print(f"seeded in {time.perf_counter() - started_at:.1f}s\n")
+        results = run_cases(benchmark_cases(dataset, work_dir, not args.skip_pages), args.repeat, args.only)
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {"meta": {"dataset": args.dataset, **dataset, "repeat": args.repeat, "time": time.time(),
+                       "python": platform.python_version(), "platform": platform.platform()},
+              "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print("no baseline to compare with, run again with --save-baseline to store one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("meta", {}).get("dataset") != args.dataset:
+        print(f"WARN - the baseline was measured on the {baseline.get("meta", {}).get("dataset")} dataset")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        sys.exit(f"\n{len(regressions)} benchmarks regressed by more than {args.tolerance:.0%}: "
+                 f"{", ".join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import functools
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AWS_CACHE_ENABLED = os.environ.get("AWS_CACHE_ENABLED", "true").lower() == "true"
+AWS_CACHE_MAX_ENTRIES = int(os.environ.get("AWS_CACHE_MAX_ENTRIES", "2048"))
+AWS_CACHE_MAX_MB = int(os.environ.get("AWS_CACHE_MAX_MB", "64"))
+
+
+def _size_of(value) -> int:
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class ResponseCache:
+    # LRU cache with a ttl per entry, bounded both by number of entries and by (estimated) bytes.
+    # Entries carry tags so writes can drop exactly the entries they make stale.
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires_at, size, tags)
+        self._keys_by_tag = {}
+        self._bytes = 0
+        # bumped by every invalidation, so a value read before a concurrent write is never stored after it
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> tuple:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def set(self, key, value, ttl: float, tags: list, generation: int):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, size, tags)
+            self._bytes += size
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self._keys_by_tag.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "entries": len(self._entries),
+                    "bytes": self._bytes}
+
+    def _remove(self, key):
+        _, _, size, tags = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+# one cache for the whole streamlit process, shared by every session
+CACHE = ResponseCache(AWS_CACHE_MAX_ENTRIES, AWS_CACHE_MAX_MB * 1024 * 1024)
+
+
+def cached(ttl: float, tags):
+    # caches the return value of a read function for ttl seconds; tags(*args, **kwargs) returns the tags of the
+    # entry. Cached values are shared between callers and must not be mutated.
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not AWS_CACHE_ENABLED:
+                return func(*args, **kwargs)
+            key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+            generation = CACHE.generation
+            hit, value = CACHE.get(key)
+            if hit:
+                return value
+            value = func(*args, **kwargs)
+            CACHE.set(key, value, ttl, tags(*args, **kwargs), generation)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate(*tags):
+    CACHE.invalidate(*tags)
+
+
+def ttl_for(operation_name: str, default_ttl: float) -> float:
+    # per operation ttl, e.g. AWS_CACHE_TTL_LIST_BUCKETS=10
+    return float(os.environ.get(f"AWS_CACHE_TTL_{operation_name.upper()}", default_ttl))
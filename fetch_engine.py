@@ -0,0 +1,20 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AWS_FETCH_MAX_WORKERS = int(os.environ.get("AWS_FETCH_MAX_WORKERS", "16"))
+
+
+def fetch_concurrently(tasks: dict, max_workers: int = AWS_FETCH_MAX_WORKERS):
+    # tasks maps a name to a callable without arguments; at most max_workers run at the same time and
+    # (name, result, exception) is yielded as soon as each one ends, so callers can render progressively
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(task): name for name, task in tasks.items()}
+        for future in as_completed(futures):
+            if future.exception():
+                yield futures[future], None, future.exception()
+            else:
+                yield futures[future], future.result(), None
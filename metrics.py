@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AWS_GUI_METRICS_LOG = os.environ.get("AWS_GUI_METRICS_LOG")
+AWS_GUI_METRICS_PORT = os.environ.get("AWS_GUI_METRICS_PORT")
+AWS_GUI_METRICS_HOST = os.environ.get("AWS_GUI_METRICS_HOST", "127.0.0.1")
+# latencies kept per series to compute the percentiles; the counters cover every call
+SAMPLES_PER_SERIES = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+_calls = {}  # (service, operation) -> series
+_renders = {}  # page -> series
+_current_call = threading.local()
+_prometheus_server = None
+
+
+def _new_series() -> dict:
+    return {"count": 0, "errors": 0, "retries": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0,
+            "samples": deque(maxlen=SAMPLES_PER_SERIES)}
+
+
+def _quantile(samples: list, quantile: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(int(quantile * len(samples)), len(samples) - 1)]
+
+
+def record_call(service: str, operation: str, seconds: float, retries: int = 0, bytes_in: int = 0,
+                bytes_out: int = 0, error: str = None):
+    with _lock:
+        series = _calls.setdefault((service, operation), _new_series())
+        series["count"] += 1
+        series["errors"] += 1 if error else 0
+        series["retries"] += retries
+        series["bytes_in"] += bytes_in
+        series["bytes_out"] += bytes_out
+        series["seconds"] += seconds
+        series["samples"].append(seconds)
+        if AWS_GUI_METRICS_LOG:
+            with open(AWS_GUI_METRICS_LOG, "a") as log:
+                log.write(json.dumps({"time": time.time(), "service": service, "operation": operation,
+                                      "seconds": seconds, "retries": retries, "bytes_in": bytes_in,
+                                      "bytes_out": bytes_out, "error": error}) + "\n")
+
+
+def record_render(page: str, seconds: float):
+    with _lock:
+        series = _renders.setdefault(page, _new_series())
+        series["count"] += 1
+        series["seconds"] += seconds
+        series["samples"].append(seconds)
+
+
+def _summary(series: dict) -> dict:
+    samples = sorted(series["samples"])
+    summary = {k: v for k, v in series.items() if k != "samples"}
+    summary.update({f"p{int(q * 100)}": _quantile(samples, q) for q in QUANTILES})
+    return summary
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {"calls": [{"service": service, "operation": operation, **_summary(series)}
+                          for (service, operation), series in sorted(_calls.items())],
+                "renders": [{"page": page, **_summary(series)} for page, series in sorted(_renders.items())]}
+
+
+def reset():
+    with _lock:
+        _calls.clear()
+        _renders.clear()
+
+
+def prometheus_text() -> str:
+    metrics_snapshot = snapshot()
+    lines = ["# HELP aws_call_duration_seconds Latency of the AWS calls, retries included",
+             "# TYPE aws_call_duration_seconds summary"]
+    for call in metrics_snapshot["calls"]:
+        labels = f'service="{call["service"]}",operation="{call["operation"]}"'
+        lines += [f'aws_call_duration_seconds{{{labels},quantile="{q}"}} {call[f"p{int(q * 100)}"]}'
+                  for q in QUANTILES]
+        lines += [f"aws_call_duration_seconds_sum{{{labels}}} {call["seconds"]}",
+                  f"aws_call_duration_seconds_count{{{labels}}} {call["count"]}"]
+    for name, key, help_text in (("aws_call_errors_total", "errors", "AWS calls that failed"),
+                                 ("aws_call_retries_total", "retries", "Retries made by the AWS calls"),
+                                 ("aws_call_received_bytes_total", "bytes_in", "Bytes received from AWS"),
+                                 ("aws_call_sent_bytes_total", "bytes_out", "Bytes sent to AWS")):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        lines += [f'{name}{{service="{call["service"]}",operation="{call["operation"]}"}} {call[key]}'
+                  for call in metrics_snapshot["calls"]]
+    lines += ["# HELP gui_page_render_seconds Time spent running the streamlit page scripts",
+              "# TYPE gui_page_render_seconds summary"]
+    for render in metrics_snapshot["renders"]:
+        labels = f'page="{render["page"]}"'
+        lines += [f'gui_page_render_seconds{{{labels},quantile="{q}"}} {render[f"p{int(q * 100)}"]}'
+                  for q in QUANTILES]
+        lines += [f"gui_page_render_seconds_sum{{{labels}}} {render["seconds"]}",
+                  f"gui_page_render_seconds_count{{{labels}}} {render["count"]}"]
+    return "\n".join(lines) + "\n"
+
+
+def _before_call(model, context, **_):
+    context["metrics_started_at"] = time.perf_counter()
+    context["metrics_operation"] = (model.service_model.service_name, model.name)
+    context["metrics_bytes_out"] = 0
+    _current_call.context = context
+
+
+def _before_send(request, **_):
+    context = getattr(_current_call, "context", None)
+    if context is not None:
+        context["metrics_bytes_out"] += int(request.headers.get("Content-Length") or 0)
+
+
+def _after_call(http_response, parsed, model, context, **_):
+    if "metrics_started_at" not in context:
+        return
+    service, operation = context["metrics_operation"]
+    error = None
+    if http_response.status_code >= 300:
+        error = parsed.get("Error", {}).get("Code") or str(http_response.status_code)
+    # the Content-Length of a HEAD response (e.g. HeadObject) is the size of the resource, no body is received
+    bytes_in = 0 if model.http.get("method") == "HEAD" else int(http_response.headers.get("Content-Length") or 0)
+    record_call(service, operation, time.perf_counter() - context["metrics_started_at"],
+                retries=parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+                bytes_in=bytes_in,
+                bytes_out=context["metrics_bytes_out"], error=error)
+    _current_call.context = None
+
+
+def _after_call_error(exception, context, **_):
+    if "metrics_started_at" not in context:
+        return
+    service, operation = context["metrics_operation"]
+    record_call(service, operation, time.perf_counter() - context["metrics_started_at"],
+                bytes_out=context["metrics_bytes_out"], error=type(exception).__name__)
+    _current_call.context = None
+
+
+def instrument(client):
+    # records latency, retries, bytes and errors of every call made by the client
+    client.meta.events.register("before-call", _before_call)
+    client.meta.events.register("before-send", _before_send)
+    client.meta.events.register("after-call", _after_call)
+    client.meta.events.register("after-call-error", _after_call_error)
+
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+def start_prometheus_server(port: int):
+    # a port already in use (e.g. by another instance of the app) only disables the exporter
+    global _prometheus_server
+    with _lock:
+        if _prometheus_server is None:
+            try:
+                _prometheus_server = ThreadingHTTPServer((AWS_GUI_METRICS_HOST, port), _PrometheusHandler)
+            except OSError as e:
+                print(f"WARN - prometheus exporter not started on {AWS_GUI_METRICS_HOST}:{port}: {e}")
+                return
+            threading.Thread(target=_prometheus_server.serve_forever, daemon=True).start()
+
+
+# started once, when the module is first imported by the streamlit process
+if AWS_GUI_METRICS_PORT:
+    start_prometheus_server(int(AWS_GUI_METRICS_PORT))
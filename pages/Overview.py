@@ -0,0 +1,61 @@
+import sys
+import time
+
+import pandas as pd
+import streamlit as st
+
+sys.path.append("../localstack_gui")
+
+from fetch_engine import fetch_concurrently, AWS_FETCH_MAX_WORKERS
+from s3_svc import list_buckets, summarize_bucket, AWS_S3_CUSTOM_ENDPOINT_URL
+from secrets_manager_svc import count_secrets, AWS_SM_CUSTOM_ENDPOINT_URL
+from sidebar_panels import cache_panel, metrics_panel
+
+render_started_at = time.perf_counter()
+
+st.title("Overview")
+st.caption(f"S3 endpoint: {AWS_S3_CUSTOM_ENDPOINT_URL} - Secrets Manager endpoint: {AWS_SM_CUSTOM_ENDPOINT_URL} - "
+           f"up to {AWS_FETCH_MAX_WORKERS} concurrent requests (AWS_FETCH_MAX_WORKERS)")
+
+st.button("Refresh", use_container_width=True)
+
+bucket_names = [b.get("Name") for b in list_buckets()]
+c1, c2, c3 = st.columns(3)
+buckets_metric, objects_metric, secrets_metric = c1.empty(), c2.empty(), c3.empty()
+buckets_metric.metric("Buckets", len(bucket_names))
+objects_metric.metric("Objects", "...")
+secrets_metric.metric("Secrets", "...")
+progress_bar = st.progress(0.0, text="Loading buckets...")
+buckets_table = st.empty()
+
+tasks = {("bucket", bucket_name): lambda bucket_name=bucket_name: summarize_bucket(bucket_name)
+         for bucket_name in bucket_names}
+tasks[("secrets", None)] = count_secrets
+
+rows = {bucket_name: {"Bucket": bucket_name, "Objects": None, "Bytes": None, "LastModified": None, "Error": None}
+        for bucket_name in bucket_names}
+completed_buckets = 0
+for (task_type, bucket_name), result, error in fetch_concurrently(tasks):
+    if task_type == "secrets":
+        secrets_metric.metric("Secrets", "error" if error else f"{result:,}")
+        continue
+    completed_buckets += 1
+    if error:
+        rows[bucket_name]["Error"] = str(error)
+    else:
+        rows[bucket_name].update(Objects=result["objects"], Bytes=result["bytes"],
+                                 LastModified=result["last_modified"])
+    progress_bar.progress(completed_buckets / len(bucket_names),
+                          text=f"{completed_buckets}/{len(bucket_names)} buckets loaded")
+    buckets_df = pd.DataFrame(rows.values(), columns=["Bucket", "Objects", "Bytes", "LastModified", "Error"])
+    objects_metric.metric("Objects", f"{int(buckets_df["Objects"].sum()):,}")
+    buckets_table.dataframe(buckets_df, hide_index=True, use_container_width=True,
+                            column_config={"Bytes": st.column_config.NumberColumn(format="%d B"),
+                                           "LastModified": st.column_config.DatetimeColumn()})
+if not bucket_names:
+    progress_bar.empty()
+    objects_metric.metric("Objects", 0)
+    st.info("There are no buckets", icon="🥞")
+
+cache_panel()
+metrics_panel("Overview", render_started_at)
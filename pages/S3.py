@@ -1,13 +1,29 @@
+import io
+import json
+import mimetypes
 import os.path
 import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 
+import pandas as pd
 import streamlit as st
 from botocore.exceptions import ClientError
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 sys.path.append("../localstack_gui")
 
-from s3_svc import delete_object, get_object, list_buckets, write_object, list_objects, download_object, \
-    create_bucket, delete_bucket, AWS_S3_CUSTOM_ENDPOINT_URL
+from s3_svc import delete_objects, head_object, get_object_tags, get_object_range, list_buckets, upload_fileobjs, \
+    local_uploads, iter_object_pages, download_objects, download_objects_zip, create_bucket, delete_bucket, \
+    force_delete_bucket, refresh_bucket_index, sync_objects, AWS_S3_CUSTOM_ENDPOINT_URL, PREVIEW_BYTES
+from s3_index import search_objects, bucket_summary, prefix_summary, SEARCH_RESULTS_LIMIT
+from sidebar_panels import cache_panel, metrics_panel
+
+render_started_at = time.perf_counter()
+
+OBJECTS_PAGE_SIZE = 1000
+OBJECTS_TABLE_COLUMNS = ["Key", "Size", "LastModified", "ETag"]
 
 st.text_input(label="Configured AWS services endpoint url for S3",
               placeholder=AWS_S3_CUSTOM_ENDPOINT_URL,
@@ -18,33 +34,240 @@ st.text_input(label="Configured AWS services endpoint url for S3",
               disabled=True)
 
 
-def delete_object_btn_handler(selected_bucket_name: str, object_key: str):
-    print(f"to delete {object_key}")
-    delete_object(selected_bucket_name, object_key)
+def delete_objects_btn_handler(selected_bucket_name: str, object_keys: list = None, key_prefix: str = None):
+    deleted_objects = 0
+    errors = []
+    for batch_deleted_objects, batch_errors in delete_objects(selected_bucket_name, object_keys=object_keys,
+                                                              prefix=key_prefix):
+        deleted_objects += batch_deleted_objects
+        errors.extend(batch_errors)
+    if errors:
+        st.session_state["error_notification"] = \
+            f"{len(errors)} objects not deleted, first error: {errors[0].get("Key")} - {errors[0].get("Message")}"
+    st.session_state["success_notification"] = f"{deleted_objects} objects deleted!"
+    listing = st.session_state.get("objects_listing")
+    if listing and listing["bucket"] == selected_bucket_name:
+        if object_keys is None:
+            st.session_state.pop("objects_listing")
+        else:
+            listing["objects"] = [o for o in listing["objects"] if o.get("Key") not in object_keys]
+            listing["generation"] += 1
+
+
+def load_objects_page(listing: dict):
+    page = next(iter_object_pages(listing["bucket"], prefix=listing["prefix"], max_keys=OBJECTS_PAGE_SIZE,
+                                  continuation_token=listing["next_token"]))
+    listing["objects"].extend(page.get("Contents", []))
+    listing["next_token"] = page.get("NextContinuationToken") if page.get("IsTruncated") else None
+    listing["generation"] += 1
+
+
+def objects_dataframe(objects: list) -> pd.DataFrame:
+    return pd.DataFrame([{"Key": obj.get("Key"),
+                          "Size": obj.get("Size"),
+                          "LastModified": obj.get("LastModified"),
+                          "ETag": (obj.get("ETag") or "").strip('"')} for obj in objects],
+                        columns=OBJECTS_TABLE_COLUMNS)
 
 
 @st.experimental_dialog(title="Object Details", width="large")
 def detail_dialog(selected_bucket_name: str, object_key: str):
     print(f"details of {object_key}")
-    get_object_result = get_object(selected_bucket_name, object_key)
-    st.write(get_object_result)
+    head_object_result = {k: v for k, v in head_object(selected_bucket_name, object_key).items()
+                          if k != "ResponseMetadata"}
+    st.write(head_object_result)
+    st.markdown("#### Tags")
+    st.write({tag.get("Key"): tag.get("Value") for tag in get_object_tags(selected_bucket_name, object_key)})
+    object_size = head_object_result.get("ContentLength")
+    if object_size and st.toggle(f"Preview the first {PREVIEW_BYTES // 1024} KB"):
+        # parameters such as "; charset=utf-8" do not change the renderer
+        content_type = (head_object_result.get("ContentType") or "").split(";")[0].strip().lower()
+        if content_type in ("", "binary/octet-stream", "application/octet-stream"):
+            content_type = mimetypes.guess_type(object_key)[0] or content_type
+        render_preview(get_object_range(selected_bucket_name, object_key), content_type,
+                       truncated=object_size > PREVIEW_BYTES)
+
+
+def render_preview(content: bytes, content_type: str, truncated: bool):
+    if truncated:
+        st.caption(f"Showing the first {len(content)} bytes of the object")
+    if content_type.startswith("image/"):
+        if truncated:
+            st.info("The image is too large to be previewed", icon="🖼️")
+        else:
+            st.image(content, width=300)
+        return
+    text = None
+    # the range may have cut a multi-byte character in half at its end
+    for cut in range(4 if truncated else 1):
+        try:
+            text = content[:len(content) - cut].decode("utf-8")
+            break
+        except UnicodeDecodeError:
+            continue
+    if text is None:
+        st.info("Binary content, download the object to see it", icon="📦")
+        return
+    if content_type in ("application/json", "text/json") and not truncated:
+        try:
+            st.json(json.loads(text))
+            return
+        except ValueError:
+            pass
+    if content_type == "text/csv":
+        # the range may have cut the last row, or a quoted multi-line field, in half
+        csv_text = text[:text.rfind("\n")] if truncated and "\n" in text else text
+        try:
+            st.dataframe(pd.read_csv(io.StringIO(csv_text)), use_container_width=True)
+            return
+        except (pd.errors.ParserError, pd.errors.EmptyDataError):
+            pass
+    st.code(text, language="json" if content_type.endswith("json") else None)
+
 
+def bulk_download_form(selected_bucket_name: str, selected_keys: list, key_prefix: str):
+    with st.form("download_form", border=False):
+        whole_prefix_label = f"Everything under '{key_prefix}'" if key_prefix else "The whole bucket"
+        download_source = st.radio("Objects to download",
+                                   [f"Selected objects ({len(selected_keys)})", whole_prefix_label],
+                                   index=0 if selected_keys else 1, horizontal=True)
+        as_zip = st.toggle("Download as a zip archive")
+        output_file_folder = os.path.dirname(os.path.abspath(__file__))
+        output_path = st.text_input(placeholder=f"output folder: {output_file_folder}",
+                                    label="Enter the output folder, or the zip file path (the current project directory is the default)")
+        skip_unchanged = st.checkbox("Skip files that are already up to date (same size and ETag)", value=True)
+        if st.form_submit_button("Download!"):
+            object_keys = selected_keys if download_source != whole_prefix_label else None
+            if as_zip:
+                output_path = output_path or os.path.join(output_file_folder, f"{selected_bucket_name}.zip")
+                results = download_objects_zip(selected_bucket_name, output_path, object_keys=object_keys,
+                                               prefix=key_prefix)
+            else:
+                output_path = output_path or output_file_folder
+                results = download_objects(selected_bucket_name, output_path, object_keys=object_keys,
+                                           prefix=key_prefix, skip_unchanged=skip_unchanged)
+            progress_text = st.empty()
+            counters = {"downloaded": 0, "skipped": 0}
+            for object_key, result in results:
+                if isinstance(result, Exception):
+                    st.error(f"Download of {object_key} failed: {result}")
+                else:
+                    counters[result] += 1
+                progress_text.text(f"{counters['downloaded']} downloaded, {counters['skipped']} skipped")
+            st.success(f"Download completed! Files saved in {output_path}", icon="✅")
 
-def download_btn_handler(selected_bucket_name: str, object_key: str):
-    output_file_folder = os.path.dirname(os.path.abspath(__file__))
-    download_object(selected_bucket_name, object_key, os.path.join(output_file_folder, object_key))
-    st.success(f"Download completed! File saved in {output_file_folder} folder", icon="✅")
 
+def bucket_summary_panel(selected_bucket_name: str, key_prefix: str, index_sync):
+    with st.expander("Bucket summary"):
+        st.button("Re-sync index", on_click=refresh_bucket_index, args=(selected_bucket_name,),
+                  kwargs={"force": True}, use_container_width=True)
+        # the figures scan the local index, they are computed only on request and not on every rerun
+        if not st.toggle("Compute the summary", key=f"bucket_summary_{selected_bucket_name}"):
+            return
+        summary = bucket_summary(selected_bucket_name)
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Objects", f"{summary["objects"]:,}")
+        c2.metric("Total size", f"{summary["bytes"] / 1024 ** 2:,.1f} MB")
+        c3.metric("Indexed at", datetime.fromtimestamp(summary["synced_at"]).strftime("%H:%M:%S")
+                  if summary["synced_at"] else "-")
+        if index_sync is not None and not index_sync.done():
+            st.caption("The bucket is being indexed, figures are still growing")
+        st.dataframe(pd.DataFrame(prefix_summary(selected_bucket_name, key_prefix),
+                                  columns=["Prefix", "Objects", "Bytes"]),
+                     hide_index=True, use_container_width=True,
+                     column_config={"Bytes": st.column_config.NumberColumn(format="%d B")})
 
-@st.experimental_dialog(title="Upload object", width="large")
+
+def index_search_filters() -> dict:
+    with st.expander("Search the bucket"):
+        c1, c2, c3, c4 = st.columns([2, 1, 1, 2])
+        key_pattern = c1.text_input("Key contains", key="key_search",
+                                    help="A substring of the key, or a glob pattern such as logs/*.gz")
+        min_size_kb = c2.number_input("Min size (KB)", min_value=0, value=0, key="min_size_kb")
+        max_size_kb = c3.number_input("Max size (KB)", min_value=0, value=0, key="max_size_kb",
+                                      help="0 means no limit")
+        modified_between = c4.date_input("Modified between", value=(), key="modified_between")
+    filters = {}
+    if key_pattern:
+        filters["key_pattern"] = key_pattern
+    if min_size_kb:
+        filters["min_size"] = min_size_kb * 1024
+    if max_size_kb:
+        filters["max_size"] = max_size_kb * 1024
+    if len(modified_between) > 0:
+        filters["modified_after"] = datetime.combine(modified_between[0], datetime.min.time(), timezone.utc)
+    if len(modified_between) > 1:
+        filters["modified_before"] = datetime.combine(modified_between[1] + timedelta(days=1), datetime.min.time(),
+                                                      timezone.utc)
+    return filters
+
+
+@st.experimental_dialog(title="Copy / Sync objects", width="large")
+def sync_dialog(source_bucket_name: str, source_prefix: str, bucket_names: list):
+    st.markdown(f"Source: `{source_bucket_name}/{source_prefix}`")
+    with st.form("sync_form", border=False):
+        destination_bucket_name = st.selectbox("Destination bucket", bucket_names)
+        destination_prefix = st.text_input("Destination key prefix", value=source_prefix)
+        delete_extraneous = st.checkbox("Delete the destination objects that are not in the source")
+        if st.form_submit_button("Sync!"):
+            progress_text = st.empty()
+            counters = {"copied": 0, "deleted": 0}
+            try:
+                for action, object_key, error in sync_objects(source_bucket_name, destination_bucket_name,
+                                                              source_prefix, destination_prefix,
+                                                              delete_extraneous=delete_extraneous):
+                    if error:
+                        st.error(f"{object_key} not {action}: {error}")
+                    else:
+                        counters[action] += 1
+                    progress_text.text(f"{counters['copied']} objects copied, {counters['deleted']} deleted")
+            except ValueError:
+                st.error("Source and destination overlap: within a bucket neither prefix can contain the other")
+                return
+            st.session_state.pop("objects_listing", None)
+            st.success(f"Sync completed! {counters['copied']} objects copied, {counters['deleted']} deleted",
+                       icon="✅")
+
+
+@st.experimental_dialog(title="Upload objects", width="large")
 def upload_dialog():
     with st.form("upload_form", clear_on_submit=True, border=False):
-        uploaded_file = st.file_uploader("Upload a file into the selected bucket")
-        key_prefix = st.text_input(label="Enter the key prefix of the object (end with / character !)")
-        if st.form_submit_button("Upload!"):
-            bytes_data = uploaded_file.getvalue()
-            write_object(selected_bucket, f"{key_prefix}{uploaded_file.name}", bytes_data)
-            st.success("File uploaded, refresh to view the file!", icon="✅")
+        uploaded_files = st.file_uploader("Upload files into the selected bucket", accept_multiple_files=True,
+                                          help="The picked files are held in memory until they are uploaded")
+        local_path = st.text_input(label="...or enter the path of a local file or folder",
+                                   help="The files are streamed from disk, whatever their size")
+        key_prefix = st.text_input(label="Enter the key prefix of the objects (end with / character !)")
+        if st.form_submit_button("Upload!") and (uploaded_files or local_path):
+            if local_path and not os.path.exists(local_path):
+                st.error(f"{local_path} does not exist")
+                return
+            uploads = [(f"{key_prefix}{uploaded_file.name}", uploaded_file) for uploaded_file in uploaded_files]
+            local_files = local_uploads(local_path, key_prefix) if local_path else []
+            uploads += local_files
+            total_bytes = (sum(uploaded_file.size for uploaded_file in uploaded_files)
+                           + sum(os.path.getsize(file_path) for _, file_path in local_files)) or 1
+            progress_bar = st.progress(0.0, text="Uploading...")
+            progress = {"bytes": 0}
+            progress_lock = threading.Lock()
+            script_run_ctx = get_script_run_ctx()
+
+            # called from the transfer threads, which need the script context to update the progress bar
+            def progress_callback(bytes_transferred: int):
+                add_script_run_ctx(threading.current_thread(), script_run_ctx)
+                with progress_lock:
+                    progress["bytes"] += bytes_transferred
+                    progress_bar.progress(min(progress["bytes"] / total_bytes, 1.0), text="Uploading...")
+
+            failed_uploads = {}
+            for object_key, error in upload_fileobjs(selected_bucket, uploads, callback=progress_callback):
+                if error:
+                    failed_uploads[object_key] = error
+            progress_bar.progress(1.0, text="Upload completed")
+            st.session_state.pop("objects_listing", None)
+            for object_key, error in failed_uploads.items():
+                st.error(f"Upload of {object_key} failed: {error}")
+            if len(failed_uploads) < len(uploads):
+                st.success(f"{len(uploads) - len(failed_uploads)} files uploaded, refresh to view them!", icon="✅")
 
 
 if "success_notification" in st.session_state:
@@ -65,32 +288,64 @@ st.markdown("---")
 st.markdown("### bucket content")
 
 if selected_bucket:
-    objects = list_objects(selected_bucket)
-    for obj in objects:
-        st.markdown(f"""- {obj.get("Key")}""")
-        c1, c2, c3 = st.columns([1, 1, 1])
-        with c1:
-            with st.popover("Download", use_container_width=True):
-                with st.form(f"download_form_{obj.get("Key")}", clear_on_submit=True, border=False):
-                    output_file_folder = os.path.dirname(os.path.abspath(__file__))
-                    output_file_path = os.path.join(output_file_folder, obj.get("Key").split("/")[-1])
-                    output_file_path = st.text_input(placeholder=f"output file: {output_file_path}", key=obj.get("Key"),
-                                                     label="------------------------------Enter the file output path (the current project directory is the default)------------------------------")
-                    if st.form_submit_button("Download!"):
-                        download_object(selected_bucket, obj.get("Key"), output_file_path)
-                        st.success(f"Download completed! File saved in {output_file_folder} folder", icon="✅")
-        with c2:
-            if st.button("Details", key=f"detail_{obj.get("Key")}", use_container_width=True):
-                detail_dialog(selected_bucket, obj.get("Key"))
-        with c3:
-            st.button("Delete", on_click=delete_object_btn_handler, args=(selected_bucket, obj.get("Key"),),
-                      key=f"delete_{obj.get("Key")}", use_container_width=True)
+    key_prefix_filter = st.text_input("Filter by key prefix", key="key_prefix_filter")
+    listing = st.session_state.get("objects_listing")
+    if not listing or listing["bucket"] != selected_bucket or listing["prefix"] != key_prefix_filter:
+        listing = {"bucket": selected_bucket, "prefix": key_prefix_filter, "objects": [], "next_token": None,
+                   "generation": 0}
+        load_objects_page(listing)
+        st.session_state["objects_listing"] = listing
+    index_sync = refresh_bucket_index(selected_bucket)
+    search_filters = index_search_filters()
+    if search_filters:
+        objects = search_objects(selected_bucket, **search_filters)
+        st.caption(f"{len(objects)} objects found in the local index"
+                   + (f" (showing the first {SEARCH_RESULTS_LIMIT})" if len(objects) == SEARCH_RESULTS_LIMIT else "")
+                   + (", the bucket is still being indexed" if index_sync is not None and not index_sync.done()
+                      else ""))
+    else:
+        objects = listing["objects"]
+        if not objects:
+            st.info("This bucket has no objects", icon="🥞")
+    objects_df = objects_dataframe(objects)
+    # a new key resets the selection whenever the rows change
+    table_key = f"objects_table_{listing["generation"]}_{hash(tuple(sorted(search_filters.items())))}"
+    table_event = st.dataframe(objects_df, on_select="rerun", selection_mode="multi-row", hide_index=True,
+                               use_container_width=True, key=table_key,
+                               column_config={"Size": st.column_config.NumberColumn(format="%d B"),
+                                              "LastModified": st.column_config.DatetimeColumn()})
+    selected_keys = objects_df.iloc[table_event.selection.rows]["Key"].tolist()
+    c1, c2, c3 = st.columns([1, 1, 1])
+    with c1:
+        with st.popover("Download", use_container_width=True):
+            bulk_download_form(selected_bucket, selected_keys, listing["prefix"])
+    with c2:
+        if st.button("Details", use_container_width=True, disabled=len(selected_keys) != 1):
+            detail_dialog(selected_bucket, selected_keys[0])
+    with c3:
+        with st.popover("Delete", use_container_width=True):
+            st.button(f"Delete the selected objects ({len(selected_keys)})", on_click=delete_objects_btn_handler,
+                      args=(selected_bucket, selected_keys,), use_container_width=True, disabled=not selected_keys)
+            confirm_delete_all = st.checkbox(f"Confirm: delete every object under '{listing["prefix"]}'"
+                                             if listing["prefix"] else "Confirm: delete every object of the bucket",
+                                             key=f"confirm_delete_all_{selected_bucket}_{listing["prefix"]}")
+            st.button(f"Delete everything under '{listing["prefix"]}'" if listing["prefix"] else "Delete all objects",
+                      on_click=delete_objects_btn_handler, kwargs={"key_prefix": listing["prefix"]},
+                      args=(selected_bucket,), use_container_width=True, type="primary",
+                      disabled=not confirm_delete_all)
+    if listing["next_token"] and not search_filters:
+        st.button(f"Load more ({len(objects)} objects loaded)", on_click=load_objects_page, args=(listing,),
+                  use_container_width=True)
+    bucket_summary_panel(selected_bucket, listing["prefix"], index_sync)
 
 st.markdown("---")
 
 if st.button("Upload into bucket", use_container_width=True):
     upload_dialog()
 
+if selected_bucket and st.button("Copy / Sync to another bucket or prefix", use_container_width=True):
+    sync_dialog(selected_bucket, st.session_state["objects_listing"]["prefix"], bucket_names)
+
 with st.popover("Create Bucket", use_container_width=True):
     with st.form("create_bucket_form", clear_on_submit=True, border=False):
         bucket_name = st.text_input(label="Bucket name")
@@ -100,10 +355,22 @@ with st.popover("Create Bucket", use_container_width=True):
             st.session_state["success_notification"] = "Bucket created!"
             st.rerun()
 
+force_delete = st.checkbox("Force: empty the bucket (objects, versions and pending uploads) before deleting it")
 if st.button(f"Delete bucket: {selected_bucket}", type="primary"):
     try:
-        delete_bucket(selected_bucket)
-        st.session_state["success_notification"] = "Bucket deleted!"
-        st.rerun()
+        if force_delete:
+            delete_errors = force_delete_bucket(selected_bucket)
+        else:
+            delete_errors = []
+            delete_bucket(selected_bucket)
+        if delete_errors:
+            st.session_state["error_notification"] = \
+                f"{len(delete_errors)} objects could not be deleted, the bucket has been kept"
+        else:
+            st.session_state["success_notification"] = "Bucket deleted!"
     except ClientError as c:
-        st.session_state["success_notification"] = c.response.get("Error").get("Message")
+        st.session_state["error_notification"] = c.response.get("Error").get("Message")
+    st.rerun()
+
+cache_panel()
+metrics_panel("S3", render_started_at)
@@ -1,7 +1,16 @@
+import json
+import time
+
+import pandas as pd
 import streamlit as st
 
-from secrets_manager_svc import list_secrets, AWS_SM_CUSTOM_ENDPOINT_URL, upsert_secret, delete_secret, \
-    describe_secret, get_secret_value
+from secrets_manager_svc import iter_secret_pages, AWS_SM_CUSTOM_ENDPOINT_URL, upsert_secret, delete_secret, \
+    describe_secret, get_secret_value, parse_secrets_file, load_secrets_directory, import_secrets, export_secrets
+from sidebar_panels import cache_panel, metrics_panel
+
+render_started_at = time.perf_counter()
+
+SECRETS_PAGE_SIZE = 100
 
 st.text_input(label="Configured AWS services endpoint url for Secrets Manager",
               placeholder=AWS_SM_CUSTOM_ENDPOINT_URL,
@@ -27,10 +36,52 @@ def upsert_dialog():
                                      already exists in the secrets manager this value will replace the existing one")
         if st.form_submit_button("Upsert secret"):
             upsert_secret(secret_id, secret_value)
+            st.session_state.pop("secrets_listing", None)
             st.session_state["success_notification"] = f"Secret with id {secret_id} successfully upserted!"
             st.rerun()
 
 
+@st.experimental_dialog(title="Bulk Import Secrets", width="large")
+def import_dialog():
+    with st.form("import_form", border=False):
+        uploaded_files = st.file_uploader("JSON, YAML or .env files mapping secret ids to values",
+                                          accept_multiple_files=True)
+        directory_path = st.text_input(label="Or a local directory",
+                                       help="Every file of the directory tree becomes a secret: its relative \
+                                       path is the secret id and its content the secret value")
+        if st.form_submit_button("Import secrets"):
+            secrets = {}
+            try:
+                for uploaded_file in uploaded_files:
+                    secrets.update(parse_secrets_file(uploaded_file.name, uploaded_file.getvalue()))
+                if directory_path:
+                    secrets.update(load_secrets_directory(directory_path))
+            except (ValueError, OSError) as e:
+                st.error(f"Unable to read the secrets: {e}")
+                return
+            progress_bar = st.progress(0.0, text="Importing...")
+            failed_imports = {}
+            for imported, (secret_id, error) in enumerate(import_secrets(secrets), start=1):
+                if error:
+                    failed_imports[secret_id] = error
+                progress_bar.progress(imported / len(secrets), text=f"{imported}/{len(secrets)} secrets imported")
+            st.session_state.pop("secrets_listing", None)
+            for secret_id, error in failed_imports.items():
+                st.error(f"Import of {secret_id} failed: {error}")
+            st.success(f"{len(secrets) - len(failed_imports)} secrets imported, refresh to view them!", icon="✅")
+
+
+@st.experimental_dialog(title="Export Secrets", width="large")
+def export_dialog(secret_ids: list):
+    st.markdown(f"Exporting {len(secret_ids)} selected secrets" if secret_ids else "Exporting every secret")
+    with st.spinner("Reading secret values..."):
+        values, errors = export_secrets(secret_ids or None)
+    for secret_id, error in errors.items():
+        st.error(f"Export of {secret_id} failed: {error}")
+    st.download_button(f"Download {len(values)} secrets as JSON", data=json.dumps(values, indent=2),
+                       file_name="secrets.json", mime="application/json", use_container_width=True)
+
+
 @st.experimental_dialog("Secret Detail", width="large")
 def detail_dialog(secret_id: str):
     st.markdown("### Secret Details")
@@ -45,8 +96,20 @@ def secret_value_dialog(secret_id: str):
     st.write(secret_value)
 
 
-def delete_secret_handler(secret_id: str):
-    delete_secret(secret_id)
+def delete_secrets_handler(secret_ids: list):
+    for secret_id in secret_ids:
+        delete_secret(secret_id)
+    listing = st.session_state.get("secrets_listing")
+    if listing:
+        listing["secrets"] = [s for s in listing["secrets"] if s.get("Name") not in secret_ids]
+        listing["generation"] += 1
+
+
+def load_secrets_page(listing: dict):
+    page = next(iter_secret_pages(max_results=SECRETS_PAGE_SIZE, next_token=listing["next_token"]))
+    listing["secrets"].extend(page.get("SecretList", []))
+    listing["next_token"] = page.get("NextToken")
+    listing["generation"] += 1
 
 
 if "success_notification" in st.session_state:
@@ -59,25 +122,53 @@ if "error_notification" in st.session_state:
 
 st.title("Secrets Manager")
 
-if st.button("Upsert secret", use_container_width=True):
-    upsert_dialog()
-
-secrets_ids = list(map(lambda s: s.get("Name"), list_secrets().get("SecretList")))
+c1, c2 = st.columns(2)
+with c1:
+    if st.button("Upsert secret", use_container_width=True):
+        upsert_dialog()
+with c2:
+    if st.button("Bulk import", use_container_width=True):
+        import_dialog()
+
+listing = st.session_state.get("secrets_listing")
+if not listing:
+    listing = {"secrets": [], "next_token": None, "generation": 0}
+    load_secrets_page(listing)
+    st.session_state["secrets_listing"] = listing
+secrets = listing["secrets"]
 st.markdown("""
 ---
 ### Secret Ids List
 """)
-if not secrets_ids:
+if not secrets:
     st.info("Your secrets manager is empty", icon="🥞")
-for s_id in secrets_ids:
-    st.markdown(f"- {s_id}")
-    c1, c2, c3 = st.columns(3)
-    with c1:
-        if st.button("View Value", key=f"value_{s_id}", use_container_width=True):
-            secret_value_dialog(s_id)
-    with c2:
-        st.button("Delete", key=f"delete_{s_id}", use_container_width=True, on_click=delete_secret_handler,
-                  args=(s_id,))
-    with c3:
-        if st.button("Detail", key=f"detail_{s_id}", use_container_width=True):
-            detail_dialog(s_id)
+secrets_df = pd.DataFrame([{"Name": s.get("Name"),
+                            "Description": s.get("Description"),
+                            "LastChangedDate": s.get("LastChangedDate"),
+                            "CreatedDate": s.get("CreatedDate")} for s in secrets],
+                          columns=["Name", "Description", "LastChangedDate", "CreatedDate"])
+secret_search = st.text_input("Search secret ids", key="secret_search")
+if secret_search:
+    secrets_df = secrets_df[secrets_df["Name"].str.contains(secret_search, regex=False)].reset_index(drop=True)
+table_event = st.dataframe(secrets_df, on_select="rerun", selection_mode="multi-row", hide_index=True,
+                           use_container_width=True, key=f"secrets_table_{listing["generation"]}")
+selected_ids = secrets_df.iloc[table_event.selection.rows]["Name"].tolist()
+c1, c2, c3, c4 = st.columns(4)
+with c1:
+    if st.button("View Value", use_container_width=True, disabled=len(selected_ids) != 1):
+        secret_value_dialog(selected_ids[0])
+with c2:
+    st.button(f"Delete ({len(selected_ids)})", use_container_width=True, on_click=delete_secrets_handler,
+              args=(selected_ids,), disabled=not selected_ids)
+with c3:
+    if st.button("Detail", use_container_width=True, disabled=len(selected_ids) != 1):
+        detail_dialog(selected_ids[0])
+with c4:
+    if st.button(f"Export ({len(selected_ids) or "all"})", use_container_width=True):
+        export_dialog(selected_ids)
+if listing["next_token"]:
+    st.button(f"Load more ({len(secrets)} secrets loaded)", on_click=load_secrets_page, args=(listing,),
+              use_container_width=True)
+
+cache_panel()
+metrics_panel("Secrets Manager", render_started_at)
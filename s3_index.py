@@ -0,0 +1,194 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+AWS_S3_INDEX_PATH = os.environ.get("AWS_S3_INDEX_PATH",
+                                   os.path.join(os.path.expanduser("~"), ".localstack_gui", "s3_index.sqlite3"))
+# the inventory outlives the process: rows are scoped to the endpoint they were listed from
+AWS_S3_CUSTOM_ENDPOINT_URL = os.environ.get("AWS_S3_CUSTOM_ENDPOINT_URL", "http://localhost:4566")
+SEARCH_RESULTS_LIMIT = 1000
+# bumped on every schema change, the index is rebuilt by the next syncs
+SCHEMA_VERSION = 2
+
+# one connection for the whole process, every access goes through the lock
+_lock = threading.Lock()
+_connection = None
+
+
+def _db() -> sqlite3.Connection:
+    global _connection
+    if _connection is None:
+        if AWS_S3_INDEX_PATH != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(AWS_S3_INDEX_PATH)), exist_ok=True)
+        connection = sqlite3.connect(AWS_S3_INDEX_PATH, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        if connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            connection.executescript(f"""
+                DROP TABLE IF EXISTS objects;
+                DROP TABLE IF EXISTS synced_buckets;
+                PRAGMA user_version = {SCHEMA_VERSION};
+            """)
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS objects (
+                endpoint TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                key TEXT NOT NULL,
+                size INTEGER,
+                last_modified TEXT,
+                etag TEXT,
+                sync_id REAL,
+                PRIMARY KEY (endpoint, bucket, key)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS objects_by_size ON objects (endpoint, bucket, size);
+            CREATE INDEX IF NOT EXISTS objects_by_last_modified ON objects (endpoint, bucket, last_modified);
+            CREATE TABLE IF NOT EXISTS synced_buckets (
+                endpoint TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                created_at TEXT,
+                synced_at REAL,
+                PRIMARY KEY (endpoint, bucket)
+            );
+        """)
+        _connection = connection
+    return _connection
+
+
+def _to_iso(last_modified) -> str:
+    if last_modified is None:
+        return datetime.now(timezone.utc).isoformat()
+    if isinstance(last_modified, datetime):
+        return last_modified.astimezone(timezone.utc).isoformat()
+    return last_modified
+
+
+def _rows(bucket_name: str, objects, sync_id: float) -> list:
+    return [(AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name, obj.get("Key"), obj.get("Size"), _to_iso(obj.get("LastModified")),
+             (obj.get("ETag") or "").strip('"') or None, sync_id) for obj in objects]
+
+
+def _upsert_rows(rows: list):
+    _db().executemany("INSERT OR REPLACE INTO objects (endpoint, bucket, key, size, last_modified, etag, sync_id) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def sync_bucket(bucket_name: str, object_pages, created_at: datetime = None):
+    # object_pages yields lists of listed objects; rows that were not listed again are removed at the end, so the
+    # index keeps answering (with the previous inventory) while a re-sync is running.
+    # created_at is the bucket creation date, it tells a re-created bucket from the one that was indexed
+    sync_id = time.time()
+    for objects in object_pages:
+        rows = _rows(bucket_name, objects, sync_id)
+        with _lock, _db():
+            _upsert_rows(rows)
+    with _lock, _db():
+        _db().execute("DELETE FROM objects WHERE endpoint = ? AND bucket = ? AND sync_id < ?",
+                      (AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name, sync_id))
+        _db().execute("INSERT OR REPLACE INTO synced_buckets (endpoint, bucket, created_at, synced_at) "
+                      "VALUES (?, ?, ?, ?)", (AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name,
+                                              _to_iso(created_at) if created_at else None, time.time()))
+
+
+def synced_at(bucket_name: str):
+    with _lock:
+        row = _db().execute("SELECT synced_at FROM synced_buckets WHERE endpoint = ? AND bucket = ?",
+                            (AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name)).fetchone()
+    return row[0] if row else None
+
+
+def is_same_bucket(bucket_name: str, created_at: datetime) -> bool:
+    # False when the indexed bucket has been deleted and created again since (e.g. the endpoint was restarted)
+    with _lock:
+        row = _db().execute("SELECT created_at FROM synced_buckets WHERE endpoint = ? AND bucket = ?",
+                            (AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name)).fetchone()
+    return row is None or row[0] is None or created_at is None or row[0] == _to_iso(created_at)
+
+
+def record_objects(bucket_name: str, objects: list):
+    # keeps the inventory of an already indexed bucket up to date after the app's own writes
+    with _lock, _db():
+        if _db().execute("SELECT 1 FROM synced_buckets WHERE endpoint = ? AND bucket = ?",
+                         (AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name)).fetchone():
+            _upsert_rows(_rows(bucket_name, objects, time.time()))
+
+
+def remove_objects(bucket_name: str, object_keys: list):
+    with _lock, _db():
+        _db().executemany("DELETE FROM objects WHERE endpoint = ? AND bucket = ? AND key = ?",
+                          [(AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name, object_key) for object_key in object_keys])
+
+
+def remove_bucket(bucket_name: str):
+    with _lock, _db():
+        _db().execute("DELETE FROM objects WHERE endpoint = ? AND bucket = ?",
+                      (AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name))
+        _db().execute("DELETE FROM synced_buckets WHERE endpoint = ? AND bucket = ?",
+                      (AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name))
+
+
+def search_objects(bucket_name: str, key_pattern: str = None, min_size: int = None, max_size: int = None,
+                   modified_after: datetime = None, modified_before: datetime = None,
+                   limit: int = SEARCH_RESULTS_LIMIT) -> list:
+    # key_pattern is a glob when it contains *, ? or [ and a substring otherwise
+    conditions, params = ["endpoint = ?", "bucket = ?"], [AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name]
+    if key_pattern:
+        if any(c in key_pattern for c in "*?["):
+            conditions.append("key GLOB ?")
+            params.append(key_pattern)
+        else:
+            conditions.append("instr(key, ?) > 0")
+            params.append(key_pattern)
+    if min_size is not None:
+        conditions.append("size >= ?")
+        params.append(min_size)
+    if max_size is not None:
+        conditions.append("size <= ?")
+        params.append(max_size)
+    if modified_after is not None:
+        conditions.append("last_modified >= ?")
+        params.append(_to_iso(modified_after))
+    if modified_before is not None:
+        conditions.append("last_modified < ?")
+        params.append(_to_iso(modified_before))
+    params.append(limit)
+    with _lock:
+        rows = _db().execute(f"SELECT key, size, last_modified, etag FROM objects WHERE {" AND ".join(conditions)} "
+                             f"ORDER BY key LIMIT ?", params).fetchall()
+    return [{"Key": key, "Size": size, "LastModified": datetime.fromisoformat(last_modified), "ETag": etag}
+            for key, size, last_modified, etag in rows]
+
+
+def bucket_summary(bucket_name: str) -> dict:
+    with _lock:
+        objects_count, total_bytes = _db().execute("SELECT count(*), coalesce(sum(size), 0) FROM objects "
+                                                   "WHERE endpoint = ? AND bucket = ?",
+                                                   (AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name)).fetchone()
+    return {"objects": objects_count, "bytes": total_bytes, "synced_at": synced_at(bucket_name)}
+
+
+def _prefix_range(prefix: str) -> tuple:
+    # keys starting with prefix are the keys in [prefix, upper bound), a range the primary key can seek
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def prefix_summary(bucket_name: str, prefix: str = "", delimiter: str = "/") -> list:
+    # objects count and bytes for each "folder" right below prefix; objects directly under it are grouped as prefix
+    conditions, params = ["endpoint = ?", "bucket = ?"], [AWS_S3_CUSTOM_ENDPOINT_URL, bucket_name]
+    if prefix:
+        conditions.append("key >= ? AND key < ?")
+        params.extend(_prefix_range(prefix))
+    with _lock:
+        rows = _db().execute(f"""
+            SELECT CASE WHEN instr(rest, ?) > 0 THEN ? || substr(rest, 1, instr(rest, ?)) ELSE ? END AS folder,
+                   count(*), coalesce(sum(size), 0)
+            FROM (SELECT substr(key, length(?) + 1) AS rest, size FROM objects WHERE {" AND ".join(conditions)})
+            GROUP BY folder
+            ORDER BY folder
+        """, (delimiter, prefix, delimiter, prefix, prefix, *params)).fetchall()
+    return [{"Prefix": folder, "Objects": objects_count, "Bytes": total_bytes}
+            for folder, objects_count, total_bytes in rows]
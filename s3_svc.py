@@ -1,58 +1,509 @@
+import hashlib
 import os
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
 
-import boto3
+from boto3.s3.transfer import TransferConfig
 from dotenv import load_dotenv
 
+import s3_index
+from aws_clients import get_client
+from cache import cached, invalidate, ttl_for
+
 load_dotenv()
 
 AWS_S3_CUSTOM_ENDPOINT_URL = os.environ.get("AWS_S3_CUSTOM_ENDPOINT_URL", "http://localhost:4566")
+AWS_S3_MULTIPART_THRESHOLD_MB = int(os.environ.get("AWS_S3_MULTIPART_THRESHOLD_MB", "8"))
+AWS_S3_MULTIPART_CHUNKSIZE_MB = int(os.environ.get("AWS_S3_MULTIPART_CHUNKSIZE_MB", "8"))
+AWS_S3_TRANSFER_MAX_CONCURRENCY = int(os.environ.get("AWS_S3_TRANSFER_MAX_CONCURRENCY", "8"))
+AWS_S3_TRANSFER_MAX_WORKERS = int(os.environ.get("AWS_S3_TRANSFER_MAX_WORKERS", "4"))
+AWS_S3_DELETE_MAX_WORKERS = int(os.environ.get("AWS_S3_DELETE_MAX_WORKERS", "8"))
+AWS_S3_COPY_MAX_WORKERS = int(os.environ.get("AWS_S3_COPY_MAX_WORKERS", "16"))
+AWS_S3_INDEX_RESYNC_SECONDS = int(os.environ.get("AWS_S3_INDEX_RESYNC_SECONDS", "300"))
+DELETE_OBJECTS_BATCH_SIZE = 1000
+PREVIEW_BYTES = 64 * 1024
+
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=AWS_S3_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+                                 multipart_chunksize=AWS_S3_MULTIPART_CHUNKSIZE_MB * 1024 * 1024,
+                                 max_concurrency=AWS_S3_TRANSFER_MAX_CONCURRENCY)
+
+
+def _client(region_name: str = None):
+    return get_client("s3", AWS_S3_CUSTOM_ENDPOINT_URL, region_name)
+
+
+BUCKETS_CACHE_TAG = ("s3", "buckets")
+
+
+def _bucket_cache_tag(bucket_name: str) -> tuple:
+    return "s3", "bucket", bucket_name
+
+
+def _listing_cache_tag(bucket_name: str) -> tuple:
+    return "s3", "listing", bucket_name
+
+
+def _object_cache_tag(bucket_name: str, object_key: str) -> tuple:
+    return "s3", "object", bucket_name, object_key
 
 
+def _invalidate_objects(bucket_name: str, object_keys: list):
+    invalidate(_listing_cache_tag(bucket_name), *[_object_cache_tag(bucket_name, k) for k in object_keys])
+
+
+def _invalidate_bucket(bucket_name: str):
+    invalidate(BUCKETS_CACHE_TAG, _bucket_cache_tag(bucket_name))
+
+
+@cached(ttl=ttl_for("list_buckets", 30), tags=lambda: [BUCKETS_CACHE_TAG])
 def list_buckets():
-    client = boto3.client("s3", endpoint_url=AWS_S3_CUSTOM_ENDPOINT_URL)
+    client = _client()
     return client.list_buckets().get("Buckets")
 
 
-def list_objects(bucket_name: str) -> list:
-    client = boto3.client("s3", endpoint_url=AWS_S3_CUSTOM_ENDPOINT_URL)
-    list_objects_response = client.list_objects_v2(Bucket=bucket_name)
-    if list_objects_response.get("IsTruncated"):
-        print("WARN - response truncated")
-    if list_objects_response.get("KeyCount") > 0:
-        return list_objects_response.get("Contents")
-    else:
+def _list_objects_page(bucket_name: str, **list_objects_args):
+    client = _client()
+    return client.list_objects_v2(Bucket=bucket_name, **list_objects_args)
+
+
+_cached_list_objects_page = cached(ttl=ttl_for("list_objects", 30),
+                                   tags=lambda bucket_name, **_: [_bucket_cache_tag(bucket_name),
+                                                                  _listing_cache_tag(bucket_name)])(_list_objects_page)
+
+
+def iter_object_pages(bucket_name: str, prefix: str = None, start_after: str = None, max_keys: int = None,
+                      continuation_token: str = None, use_cache: bool = True):
+    # bulk traversals pass use_cache=False so that they do not evict every other cached response
+    list_objects_page = _cached_list_objects_page if use_cache else _list_objects_page
+    list_objects_args = {}
+    if prefix:
+        list_objects_args["Prefix"] = prefix
+    if start_after:
+        list_objects_args["StartAfter"] = start_after
+    if max_keys:
+        list_objects_args["MaxKeys"] = max_keys
+    if continuation_token:
+        list_objects_args["ContinuationToken"] = continuation_token
+    while True:
+        list_objects_response = list_objects_page(bucket_name, **list_objects_args)
+        yield list_objects_response
+        if not list_objects_response.get("IsTruncated"):
+            return
+        list_objects_args["ContinuationToken"] = list_objects_response.get("NextContinuationToken")
+
+
+def iter_objects(bucket_name: str, prefix: str = None):
+    for page in iter_object_pages(bucket_name, prefix=prefix, use_cache=False):
+        yield from page.get("Contents", [])
+
+
+def list_objects(bucket_name: str, prefix: str = None) -> list:
+    objects = list(iter_objects(bucket_name, prefix=prefix))
+    if not objects:
         print(f"WARN - any result found for bucket {bucket_name}")
-        return []
+    return objects
+
+
+def summarize_bucket(bucket_name: str) -> dict:
+    summary = {"objects": 0, "bytes": 0, "last_modified": None}
+    for obj in iter_objects(bucket_name):
+        summary["objects"] += 1
+        summary["bytes"] += obj.get("Size", 0)
+        if summary["last_modified"] is None or obj.get("LastModified") > summary["last_modified"]:
+            summary["last_modified"] = obj.get("LastModified")
+    return summary
 
 
 def write_object(bucket_name: str, object_key: str, object_data: bytes):
-    client = boto3.client("s3", endpoint_url=AWS_S3_CUSTOM_ENDPOINT_URL)
-    return client.put_object(Bucket=bucket_name, Key=object_key, Body=object_data)
+    client = _client()
+    put_object_response = client.put_object(Bucket=bucket_name, Key=object_key, Body=object_data)
+    _invalidate_objects(bucket_name, [object_key])
+    s3_index.record_objects(bucket_name, [{"Key": object_key, "Size": len(object_data),
+                                           "ETag": put_object_response.get("ETag")}])
+    return put_object_response
+
+
+def upload_fileobj(bucket_name: str, object_key: str, fileobj, callback=None):
+    # fileobj is a binary file object or the path of a local file, which is opened (and streamed from disk) only
+    # when its upload starts
+    if isinstance(fileobj, str):
+        with open(fileobj, "rb") as f:
+            return upload_fileobj(bucket_name, object_key, f, callback)
+    client = _client()
+    uploaded_bytes = [0]
+    uploaded_bytes_lock = threading.Lock()
+
+    # counts the uploaded bytes for the index, the transfer manager may close fileobj when it is done
+    def progress_callback(bytes_transferred: int):
+        with uploaded_bytes_lock:
+            uploaded_bytes[0] += bytes_transferred
+        if callback:
+            callback(bytes_transferred)
+
+    try:
+        client.upload_fileobj(Fileobj=fileobj, Bucket=bucket_name, Key=object_key, Config=TRANSFER_CONFIG,
+                              Callback=progress_callback)
+    finally:
+        # a failed multipart upload may still have replaced the object
+        _invalidate_objects(bucket_name, [object_key])
+    # the etag is filled in by the next index sync
+    s3_index.record_objects(bucket_name, [{"Key": object_key, "Size": uploaded_bytes[0]}])
+
+
+def local_uploads(local_path: str, key_prefix: str = "") -> list:
+    # (object key, file path) of a local file, or of every file under a local folder keeping its hierarchy
+    if os.path.isfile(local_path):
+        return [(f"{key_prefix}{os.path.basename(local_path)}", local_path)]
+    return [(key_prefix + os.path.relpath(os.path.join(root, file_name), local_path).replace(os.sep, "/"),
+             os.path.join(root, file_name))
+            for root, _, file_names in os.walk(local_path) for file_name in sorted(file_names)]
+
+
+def upload_fileobjs(bucket_name: str, uploads: list, callback=None, max_workers: int = AWS_S3_TRANSFER_MAX_WORKERS):
+    # uploads is a list of (object_key, fileobj or local file path);
+    # yields (object_key, exception or None) as each upload ends
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(upload_fileobj, bucket_name, object_key, fileobj, callback): object_key
+                   for object_key, fileobj in uploads}
+        for future in as_completed(futures):
+            yield futures[future], future.exception()
 
 
 def delete_object(bucket_name: str, object_key: str):
-    client = boto3.client("s3", endpoint_url=AWS_S3_CUSTOM_ENDPOINT_URL)
-    return client.delete_object(Bucket=bucket_name, Key=object_key)
+    client = _client()
+    delete_object_response = client.delete_object(Bucket=bucket_name, Key=object_key)
+    _invalidate_objects(bucket_name, [object_key])
+    s3_index.remove_objects(bucket_name, [object_key])
+    return delete_object_response
+
+
+def _batched(iterable, batch_size: int):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def _map_bounded(func, items, max_workers: int, max_pending: int):
+    # runs func on each item of a (possibly streaming) iterable keeping at most max_pending calls queued;
+    # yields (item, future) as each call ends
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for item in items:
+            futures[executor.submit(func, item)] = item
+            if len(futures) >= max_pending:
+                done = next(as_completed(futures))
+                yield futures.pop(done), done
+        for done in as_completed(list(futures)):
+            yield futures.pop(done), done
+
+
+def _delete_batch(bucket_name: str, object_identifiers: list) -> tuple:
+    client = _client()
+    delete_objects_response = client.delete_objects(Bucket=bucket_name,
+                                                    Delete={"Objects": object_identifiers, "Quiet": True})
+    _invalidate_objects(bucket_name, [o.get("Key") for o in object_identifiers])
+    errors = delete_objects_response.get("Errors", [])
+    # deleting a single version does not remove the key, empty_bucket drops the whole bucket from the index instead
+    failed_keys = {e.get("Key") for e in errors}
+    s3_index.remove_objects(bucket_name, [o.get("Key") for o in object_identifiers
+                                          if "VersionId" not in o and o.get("Key") not in failed_keys])
+    return len(object_identifiers) - len(errors), errors
+
+
+def _delete_in_batches(bucket_name: str, object_identifiers, max_workers: int):
+    # yields (deleted count, errors) for each batch of 1000 identifiers, with up to max_workers batches in flight
+    for _, done in _map_bounded(lambda batch: _delete_batch(bucket_name, batch),
+                                _batched(object_identifiers, DELETE_OBJECTS_BATCH_SIZE), max_workers, max_workers):
+        yield done.result()
+
+
+def delete_objects(bucket_name: str, object_keys: list = None, prefix: str = None,
+                   max_workers: int = AWS_S3_DELETE_MAX_WORKERS):
+    # deletes the given keys, or every key under prefix; yields (deleted count, errors) per batch
+    if object_keys is None:
+        object_identifiers = ({"Key": obj.get("Key")} for obj in iter_objects(bucket_name, prefix=prefix))
+    else:
+        object_identifiers = ({"Key": object_key} for object_key in object_keys)
+    yield from _delete_in_batches(bucket_name, object_identifiers, max_workers)
+
+
+def abort_multipart_uploads(bucket_name: str) -> int:
+    client = _client()
+    aborted_uploads = 0
+    for page in client.get_paginator("list_multipart_uploads").paginate(Bucket=bucket_name):
+        for upload in page.get("Uploads", []):
+            client.abort_multipart_upload(Bucket=bucket_name, Key=upload.get("Key"), UploadId=upload.get("UploadId"))
+            aborted_uploads += 1
+    return aborted_uploads
+
+
+def empty_bucket(bucket_name: str, max_workers: int = AWS_S3_DELETE_MAX_WORKERS):
+    # removes every object version, delete marker and incomplete multipart upload of the bucket.
+    # Each round lists up to max_workers pages of versions from the start, then deletes them as parallel batches of
+    # 1000: the listing never pages with markers while deletes run, how that behaves depends on how the backend
+    # handles the deleted markers
+    client = _client()
+    abort_multipart_uploads(bucket_name)
+    while True:
+        pages = islice(client.get_paginator("list_object_versions").paginate(Bucket=bucket_name), max_workers)
+        object_identifiers = [{"Key": version.get("Key"), "VersionId": version.get("VersionId")}
+                              for page in pages
+                              for version in page.get("Versions", []) + page.get("DeleteMarkers", [])]
+        if not object_identifiers:
+            break
+        failed = False
+        for _, done in _map_bounded(lambda batch: _delete_batch(bucket_name, batch),
+                                    _batched(object_identifiers, DELETE_OBJECTS_BATCH_SIZE), max_workers, max_workers):
+            deleted_count, errors = done.result()
+            failed = failed or bool(errors)
+            yield deleted_count, errors
+        if failed:
+            # the versions that could not be deleted would be listed again by the next round
+            return
+    s3_index.remove_bucket(bucket_name)
+
+
+def force_delete_bucket(bucket_name: str, max_workers: int = AWS_S3_DELETE_MAX_WORKERS):
+    errors = []
+    for _, batch_errors in empty_bucket(bucket_name, max_workers=max_workers):
+        errors.extend(batch_errors)
+    if errors:
+        return errors
+    delete_bucket(bucket_name)
+    return []
 
 
 def get_object(bucket_name: str, object_key: str):
-    client = boto3.client("s3", endpoint_url=AWS_S3_CUSTOM_ENDPOINT_URL)
+    client = _client()
     return client.get_object(Bucket=bucket_name, Key=object_key)
 
 
+def _object_cache_tags(bucket_name: str, object_key: str, *_, **__) -> list:
+    return [_bucket_cache_tag(bucket_name), _object_cache_tag(bucket_name, object_key)]
+
+
+@cached(ttl=ttl_for("head_object", 60), tags=_object_cache_tags)
+def head_object(bucket_name: str, object_key: str):
+    client = _client()
+    return client.head_object(Bucket=bucket_name, Key=object_key)
+
+
+@cached(ttl=ttl_for("get_object_tagging", 60), tags=_object_cache_tags)
+def get_object_tags(bucket_name: str, object_key: str) -> list:
+    client = _client()
+    return client.get_object_tagging(Bucket=bucket_name, Key=object_key).get("TagSet")
+
+
+@cached(ttl=ttl_for("get_object_range", 60), tags=_object_cache_tags)
+def get_object_range(bucket_name: str, object_key: str, length: int = PREVIEW_BYTES) -> bytes:
+    client = _client()
+    get_object_response = client.get_object(Bucket=bucket_name, Key=object_key, Range=f"bytes=0-{length - 1}")
+    with get_object_response.get("Body") as body:
+        return body.read()
+
+
 def download_object(bucket_name: str, object_key: str, output_file_path: str):
-    client = boto3.client("s3", endpoint_url=AWS_S3_CUSTOM_ENDPOINT_URL)
-    client.download_file(Bucket=bucket_name, Key=object_key, Filename=output_file_path)
+    client = _client()
+    client.download_file(Bucket=bucket_name, Key=object_key, Filename=output_file_path, Config=TRANSFER_CONFIG)
+
+
+def _is_unchanged(file_path: str, size: int, etag: str) -> bool:
+    if not os.path.isfile(file_path) or os.path.getsize(file_path) != size:
+        return False
+    etag = etag.strip('"')
+    if "-" in etag:
+        # multipart etags are not the md5 of the content, the size check is the best we can do
+        return True
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(chunk)
+    return md5.hexdigest() == etag
+
+
+def _download_into_folder(bucket_name: str, obj: dict, output_folder: str, skip_unchanged: bool) -> str:
+    object_key = obj.get("Key")
+    output_file_path = os.path.abspath(os.path.join(output_folder, object_key))
+    if not output_file_path.startswith(os.path.abspath(output_folder) + os.sep):
+        raise ValueError(f"object key {object_key} points outside of {output_folder}")
+    if skip_unchanged:
+        if "Size" not in obj:
+            head_object_response = _client().head_object(Bucket=bucket_name, Key=object_key)
+            obj = {"Key": object_key, "Size": head_object_response.get("ContentLength"),
+                   "ETag": head_object_response.get("ETag")}
+        if _is_unchanged(output_file_path, obj.get("Size"), obj.get("ETag", "")):
+            return "skipped"
+    os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
+    download_object(bucket_name, object_key, output_file_path)
+    return "downloaded"
+
+
+def _objects_to_download(bucket_name: str, object_keys: list = None, prefix: str = None):
+    objects = iter_objects(bucket_name, prefix=prefix) if object_keys is None else ({"Key": k} for k in object_keys)
+    # keys ending with / are folder placeholders, there is nothing to download
+    return (obj for obj in objects if not obj.get("Key").endswith("/"))
+
+
+def download_objects(bucket_name: str, output_folder: str, object_keys: list = None, prefix: str = None,
+                     skip_unchanged: bool = True, max_workers: int = AWS_S3_TRANSFER_MAX_WORKERS):
+    # downloads the given keys, or every key under prefix, mirroring the key hierarchy into output_folder;
+    # yields (object_key, "downloaded" | "skipped" | exception) as each download ends
+    for obj, done in _map_bounded(lambda o: _download_into_folder(bucket_name, o, output_folder, skip_unchanged),
+                                  _objects_to_download(bucket_name, object_keys, prefix), max_workers, max_workers * 2):
+        yield obj.get("Key"), done.exception() or done.result()
+
+
+def _write_zip_entry(archive: zipfile.ZipFile, object_key: str, get_object_future):
+    try:
+        body = get_object_future.result().get("Body")
+        with body, archive.open(object_key, "w", force_zip64=True) as entry:
+            for chunk in body.iter_chunks(1024 * 1024):
+                entry.write(chunk)
+    except Exception as e:
+        return object_key, e
+    return object_key, "downloaded"
+
+
+def download_objects_zip(bucket_name: str, output_file, object_keys: list = None, prefix: str = None,
+                         max_workers: int = AWS_S3_TRANSFER_MAX_WORKERS):
+    # streams the given keys, or every key under prefix, into a zip archive (a path or a writable file object);
+    # up to max_workers requests are opened ahead while the current body is copied chunk by chunk
+    client = _client()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            zipfile.ZipFile(output_file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        pending = deque()
+        for obj in _objects_to_download(bucket_name, object_keys, prefix):
+            object_key = obj.get("Key")
+            pending.append((object_key, executor.submit(client.get_object, Bucket=bucket_name, Key=object_key)))
+            if len(pending) >= max_workers:
+                yield _write_zip_entry(archive, *pending.popleft())
+        while pending:
+            yield _write_zip_entry(archive, *pending.popleft())
+
+
+def copy_object(source_bucket_name: str, source_object: dict, bucket_name: str, object_key: str):
+    # server side copy: the bytes never go through this host. Objects above the multipart threshold are copied
+    # part by part by the transfer manager, smaller ones with a single copy_object (their size is already known
+    # from the listing, so the transfer manager's extra head_object is skipped)
+    client = _client()
+    copy_source = {"Bucket": source_bucket_name, "Key": source_object.get("Key")}
+    try:
+        if source_object.get("Size", 0) < TRANSFER_CONFIG.multipart_threshold:
+            client.copy_object(CopySource=copy_source, Bucket=bucket_name, Key=object_key)
+        else:
+            client.copy(CopySource=copy_source, Bucket=bucket_name, Key=object_key, Config=TRANSFER_CONFIG)
+    finally:
+        _invalidate_objects(bucket_name, [object_key])
+    s3_index.record_objects(bucket_name, [{"Key": object_key, "Size": source_object.get("Size")}])
+
+
+def _is_same_object(source_object: dict, destination_object: dict) -> bool:
+    if source_object.get("Size") != destination_object.get("Size"):
+        return False
+    source_etag, destination_etag = source_object.get("ETag", ""), destination_object.get("ETag", "")
+    if "-" in source_etag or "-" in destination_etag:
+        # multipart etags depend on the part size, a copy newer than its source is considered up to date
+        return destination_object.get("LastModified") >= source_object.get("LastModified")
+    return source_etag == destination_etag
+
+
+def diff_objects(source_bucket_name: str, bucket_name: str, source_prefix: str = "", prefix: str = ""):
+    # merge-joins the two listings, which both come sorted by key, on the key relative to the prefixes and compares
+    # size and etag; yields ("copy", source object, destination key) and ("delete", None, destination key) in key order
+    destination_objects = iter_objects(bucket_name, prefix=prefix)
+    destination_object = next(destination_objects, None)
+    for source_object in iter_objects(source_bucket_name, prefix=source_prefix):
+        relative_key = source_object.get("Key")[len(source_prefix):]
+        while destination_object is not None and destination_object.get("Key")[len(prefix):] < relative_key:
+            yield "delete", None, destination_object.get("Key")
+            destination_object = next(destination_objects, None)
+        if destination_object is not None and destination_object.get("Key")[len(prefix):] == relative_key:
+            if not _is_same_object(source_object, destination_object):
+                yield "copy", source_object, destination_object.get("Key")
+            destination_object = next(destination_objects, None)
+        else:
+            yield "copy", source_object, f"{prefix}{relative_key}"
+    while destination_object is not None:
+        yield "delete", None, destination_object.get("Key")
+        destination_object = next(destination_objects, None)
+
+
+def sync_objects(source_bucket_name: str, bucket_name: str, source_prefix: str = "", prefix: str = "",
+                 delete_extraneous: bool = False, max_workers: int = AWS_S3_COPY_MAX_WORKERS):
+    # makes bucket_name/prefix a copy of source_bucket_name/source_prefix transferring only the changed keys;
+    # yields ("copied" | "deleted", object_key, exception or None)
+    if source_bucket_name == bucket_name and (prefix.startswith(source_prefix) or source_prefix.startswith(prefix)):
+        # the listings stream while the copies are written: the copies would be listed, and copied, again
+        raise ValueError(f"{bucket_name}/{prefix} and {source_bucket_name}/{source_prefix} overlap")
+    extraneous_keys = []
+
+    def changed_objects():
+        for action, source_object, object_key in diff_objects(source_bucket_name, bucket_name, source_prefix, prefix):
+            if action == "copy":
+                yield source_object, object_key
+            elif delete_extraneous:
+                extraneous_keys.append(object_key)
+
+    for (source_object, object_key), done in _map_bounded(
+            lambda copy: copy_object(source_bucket_name, copy[0], bucket_name, copy[1]),
+            changed_objects(), max_workers, max_workers * 2):
+        yield "copied", object_key, done.exception()
+    failed_deletes = {}
+    for _, errors in delete_objects(bucket_name, object_keys=extraneous_keys):
+        failed_deletes.update({e.get("Key"): Exception(e.get("Message")) for e in errors})
+    for object_key in extraneous_keys:
+        yield "deleted", object_key, failed_deletes.get(object_key)
 
 
 def create_bucket(bucket_name: str):
-    client = boto3.client("s3", endpoint_url=AWS_S3_CUSTOM_ENDPOINT_URL, region_name="us-east-1")
-    return client.create_bucket(Bucket=bucket_name)
+    client = _client(region_name="us-east-1")
+    create_bucket_response = client.create_bucket(Bucket=bucket_name)
+    _invalidate_bucket(bucket_name)
+    return create_bucket_response
 
 
 def delete_bucket(bucket_name: str):
-    client = boto3.client("s3", endpoint_url=AWS_S3_CUSTOM_ENDPOINT_URL)
-    return client.delete_bucket(Bucket=bucket_name)
+    client = _client()
+    delete_bucket_response = client.delete_bucket(Bucket=bucket_name)
+    _invalidate_bucket(bucket_name)
+    s3_index.remove_bucket(bucket_name)
+    return delete_bucket_response
+
+
+_index_sync_executor = ThreadPoolExecutor(max_workers=2)
+_index_syncs = {}
+_index_syncs_lock = threading.Lock()
+
+
+def _bucket_creation_date(bucket_name: str):
+    return next((b.get("CreationDate") for b in list_buckets() if b.get("Name") == bucket_name), None)
+
+
+def sync_bucket_index(bucket_name: str):
+    s3_index.sync_bucket(bucket_name, (page.get("Contents", [])
+                                       for page in iter_object_pages(bucket_name, use_cache=False)),
+                         created_at=_bucket_creation_date(bucket_name))
+
+
+def refresh_bucket_index(bucket_name: str, force: bool = False):
+    # starts a background sync of the bucket inventory when it has never been indexed, is older than
+    # AWS_S3_INDEX_RESYNC_SECONDS or force is set; returns the future of the running sync, if any
+    with _index_syncs_lock:
+        running_sync = _index_syncs.get(bucket_name)
+        if running_sync is not None and not running_sync.done():
+            return running_sync
+        if not s3_index.is_same_bucket(bucket_name, _bucket_creation_date(bucket_name)):
+            # the inventory belongs to a previous bucket with the same name
+            s3_index.remove_bucket(bucket_name)
+        synced_at = s3_index.synced_at(bucket_name)
+        if force or synced_at is None or time.time() - synced_at > AWS_S3_INDEX_RESYNC_SECONDS:
+            _index_syncs[bucket_name] = _index_sync_executor.submit(sync_bucket_index, bucket_name)
+            return _index_syncs[bucket_name]
+        return None
 
 
 if __name__ == '__main__':
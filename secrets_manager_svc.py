@@ -1,45 +1,204 @@
+import base64
+import io
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import boto3
-from dotenv import load_dotenv
+from botocore.exceptions import ClientError
+from dotenv import dotenv_values, load_dotenv
+
+from aws_clients import get_client
+from cache import cached, invalidate, ttl_for
 
 load_dotenv()
 
 AWS_SM_CUSTOM_ENDPOINT_URL = os.environ.get("AWS_SM_CUSTOM_ENDPOINT_URL", "http://localhost:4566")
+AWS_SM_MAX_WORKERS = int(os.environ.get("AWS_SM_MAX_WORKERS", "8"))
+BATCH_GET_SECRET_VALUE_SIZE = 20
+UNSUPPORTED_OPERATION_ERROR_CODES = ("InvalidAction", "UnknownOperationException", "NotImplementedException",
+                                     "InternalFailure")
+
+
+def _client():
+    return get_client("secretsmanager", AWS_SM_CUSTOM_ENDPOINT_URL, "us-east-1")
+
+
+SECRETS_LISTING_CACHE_TAG = ("secretsmanager", "listing")
+
+
+def _secret_cache_tags(secret_id: str, *_, **__) -> list:
+    return [("secretsmanager", "secret", secret_id)]
+
+
+def _invalidate_secret(secret_id: str):
+    invalidate(SECRETS_LISTING_CACHE_TAG, *_secret_cache_tags(secret_id))
+
+
+def _list_secrets_page(**list_secrets_args):
+    client = _client()
+    return client.list_secrets(**list_secrets_args)
+
+
+_cached_list_secrets_page = cached(ttl=ttl_for("list_secrets", 30),
+                                   tags=lambda **_: [SECRETS_LISTING_CACHE_TAG])(_list_secrets_page)
+
+
+def iter_secret_pages(max_results: int = None, next_token: str = None, use_cache: bool = True):
+    # bulk traversals pass use_cache=False so that they do not evict every other cached response
+    list_secrets_page = _cached_list_secrets_page if use_cache else _list_secrets_page
+    list_secrets_args = {}
+    if max_results:
+        list_secrets_args["MaxResults"] = max_results
+    if next_token:
+        list_secrets_args["NextToken"] = next_token
+    while True:
+        list_secrets_response = list_secrets_page(**list_secrets_args)
+        yield list_secrets_response
+        if not list_secrets_response.get("NextToken"):
+            return
+        list_secrets_args["NextToken"] = list_secrets_response.get("NextToken")
 
 
 def list_secrets():
-    client = boto3.client('secretsmanager', endpoint_url=AWS_SM_CUSTOM_ENDPOINT_URL, region_name='us-east-1')
-    return client.list_secrets()
+    for page in iter_secret_pages(use_cache=False):
+        yield from page.get("SecretList", [])
+
+
+def count_secrets() -> int:
+    return sum(len(page.get("SecretList", [])) for page in iter_secret_pages(max_results=100, use_cache=False))
 
 
 def upsert_secret(secret_id: str, secret_value: str):
-    client = boto3.client('secretsmanager', endpoint_url=AWS_SM_CUSTOM_ENDPOINT_URL, region_name='us-east-1')
-    secret_ids = list(map(lambda s: s.get("Name"), client.list_secrets().get("SecretList")))
-    if secret_id not in secret_ids:
-        client.create_secret(
-            Name=secret_id,
-            SecretString=secret_value,
-        )
-        print(f"created secret with id {secret_id} and value {secret_value}")
-    else:
+    client = _client()
+    try:
         client.put_secret_value(
             SecretId=secret_id,
             SecretString=secret_value,
         )
-        print(f"updated secret with id {secret_id} and value {secret_value}")
+        print(f"updated secret with id {secret_id}")
+    except ClientError as c:
+        if c.response.get("Error").get("Code") != "ResourceNotFoundException":
+            raise
+        client.create_secret(
+            Name=secret_id,
+            SecretString=secret_value,
+        )
+        print(f"created secret with id {secret_id}")
+    finally:
+        _invalidate_secret(secret_id)
 
 
+@cached(ttl=ttl_for("get_secret_value", 10), tags=_secret_cache_tags)
 def get_secret_value(secret_id: str):
-    client = boto3.client('secretsmanager', endpoint_url=AWS_SM_CUSTOM_ENDPOINT_URL, region_name='us-east-1')
+    client = _client()
     return client.get_secret_value(SecretId=secret_id)
 
 
+@cached(ttl=ttl_for("describe_secret", 30), tags=_secret_cache_tags)
 def describe_secret(secret_id: str):
-    client = boto3.client('secretsmanager', endpoint_url=AWS_SM_CUSTOM_ENDPOINT_URL, region_name='us-east-1')
+    client = _client()
     return client.describe_secret(SecretId=secret_id)
 
 
 def delete_secret(secret_id: str):
-    client = boto3.client('secretsmanager', endpoint_url=AWS_SM_CUSTOM_ENDPOINT_URL, region_name='us-east-1')
-    return client.delete_secret(SecretId=secret_id, ForceDeleteWithoutRecovery=True)
+    client = _client()
+    delete_secret_response = client.delete_secret(SecretId=secret_id, ForceDeleteWithoutRecovery=True)
+    _invalidate_secret(secret_id)
+    return delete_secret_response
+
+
+def parse_secrets_file(file_name: str, content) -> dict:
+    # json and yaml files hold a mapping of secret id -> value, anything else is read as a .env file
+    text = content.decode("utf-8") if isinstance(content, bytes) else content
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == ".json":
+        secrets = json.loads(text)
+    elif extension in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("PyYAML must be installed to import yaml files (pip install pyyaml)")
+        secrets = yaml.safe_load(text) or {}
+    else:
+        secrets = dotenv_values(stream=io.StringIO(text))
+    if not isinstance(secrets, dict):
+        raise ValueError(f"{file_name} does not contain a mapping of secret ids to values")
+    return {str(secret_id): value if isinstance(value, str) else json.dumps(value)
+            for secret_id, value in secrets.items()}
+
+
+def load_secrets_directory(directory_path: str) -> dict:
+    # every file of the tree is a secret: its path relative to the directory is the id, its content the value
+    secrets = {}
+    for root, _, file_names in os.walk(directory_path):
+        for file_name in file_names:
+            file_path = os.path.join(root, file_name)
+            secret_id = os.path.relpath(file_path, directory_path).replace(os.sep, "/")
+            with open(file_path, encoding="utf-8") as f:
+                secrets[secret_id] = f.read()
+    return secrets
+
+
+def import_secrets(secrets: dict, max_workers: int = AWS_SM_MAX_WORKERS):
+    # upserts every secret id -> value; yields (secret_id, exception or None) as each upsert ends
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(upsert_secret, secret_id, secret_value): secret_id
+                   for secret_id, secret_value in secrets.items()}
+        for future in as_completed(futures):
+            yield futures[future], future.exception()
+
+
+def _secret_value(secret_value_response: dict) -> str:
+    if "SecretString" in secret_value_response:
+        return secret_value_response.get("SecretString")
+    return base64.b64encode(secret_value_response.get("SecretBinary")).decode("ascii")
+
+
+def _get_secret_values_one_by_one(secret_ids: list, executor: ThreadPoolExecutor) -> tuple:
+    # bulk reads bypass the response cache, like the batch path
+    client = _client()
+    values, errors = {}, {}
+    futures = {executor.submit(client.get_secret_value, SecretId=secret_id): secret_id for secret_id in secret_ids}
+    for future in as_completed(futures):
+        if future.exception():
+            errors[futures[future]] = str(future.exception())
+        else:
+            values[futures[future]] = _secret_value(future.result())
+    return values, errors
+
+
+def _batch_get_secret_values(secret_ids: list) -> tuple:
+    client = _client()
+    batch_get_response = client.batch_get_secret_value(SecretIdList=secret_ids)
+    values = {s.get("Name"): _secret_value(s) for s in batch_get_response.get("SecretValues", [])}
+    errors = {e.get("SecretId"): e.get("Message") for e in batch_get_response.get("Errors", [])}
+    return values, errors
+
+
+def export_secrets(secret_ids: list = None, max_workers: int = AWS_SM_MAX_WORKERS) -> tuple:
+    # returns ({secret_id: value}, {secret_id: error}); values are read 20 at a time with batch_get_secret_value,
+    # or one by one on a thread pool when the endpoint does not implement it
+    if secret_ids is None:
+        secret_ids = [s.get("Name") for s in list_secrets()]
+    values, errors = {}, {}
+    batch_supported = True
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        batches = [secret_ids[i:i + BATCH_GET_SECRET_VALUE_SIZE]
+                   for i in range(0, len(secret_ids), BATCH_GET_SECRET_VALUE_SIZE)]
+        if batches:
+            try:
+                batch_values, batch_errors = _batch_get_secret_values(batches[0])
+                values.update(batch_values)
+                errors.update(batch_errors)
+            except ClientError as c:
+                if c.response.get("Error").get("Code") not in UNSUPPORTED_OPERATION_ERROR_CODES:
+                    raise
+                print("WARN - batch_get_secret_value not supported by the endpoint, reading secrets one by one")
+                batch_supported = False
+        if batch_supported:
+            for batch_values, batch_errors in executor.map(_batch_get_secret_values, batches[1:]):
+                values.update(batch_values)
+                errors.update(batch_errors)
+        else:
+            values, errors = _get_secret_values_one_by_one(secret_ids, executor)
+    return values, errors
@@ -0,0 +1,54 @@
+import json
+import time
+
+import pandas as pd
+import streamlit as st
+
+import metrics
+from cache import CACHE
+
+SESSION_LISTING_KEYS = ("objects_listing", "secrets_listing")
+
+
+def refresh_data_handler():
+    CACHE.clear()
+    for session_key in SESSION_LISTING_KEYS:
+        st.session_state.pop(session_key, None)
+
+
+def cache_panel():
+    with st.sidebar:
+        st.markdown("### Cache")
+        cache_stats = CACHE.stats()
+        st.metric("Hit rate", f"{cache_stats["hit_rate"]:.0%}",
+                  help="Share of list/describe calls answered from the cache, shared by every session")
+        st.caption(f"{cache_stats["hits"]} hits, {cache_stats["misses"]} misses, {cache_stats["entries"]} entries, "
+                   f"{cache_stats["bytes"] / 1024:.0f} KB")
+        st.button("Refresh data", on_click=refresh_data_handler, use_container_width=True,
+                  help="Drop every cached response and reload the lists from the AWS endpoint")
+
+
+def metrics_panel(page_name: str, render_started_at: float):
+    # records the render time of the page (up to this call) and shows the collected figures
+    metrics.record_render(page_name, time.perf_counter() - render_started_at)
+    metrics_snapshot = metrics.snapshot()
+    with st.sidebar:
+        st.markdown("### Metrics")
+        st.caption("AWS calls, latencies in ms")
+        calls_df = pd.DataFrame(metrics_snapshot["calls"],
+                                columns=["service", "operation", "count", "errors", "retries", "bytes_in",
+                                         "bytes_out", "p50", "p95", "p99"])
+        calls_df[["p50", "p95", "p99"]] *= 1000
+        st.dataframe(calls_df, hide_index=True, use_container_width=True,
+                     column_config={p: st.column_config.NumberColumn(format="%.1f") for p in ("p50", "p95", "p99")})
+        st.caption("Page renders, in ms")
+        renders_df = pd.DataFrame(metrics_snapshot["renders"], columns=["page", "count", "p50", "p95", "p99"])
+        renders_df[["p50", "p95", "p99"]] *= 1000
+        st.dataframe(renders_df, hide_index=True, use_container_width=True,
+                     column_config={p: st.column_config.NumberColumn(format="%.1f") for p in ("p50", "p95", "p99")})
+        c1, c2 = st.columns(2)
+        c1.download_button("Prometheus", data=metrics.prometheus_text(), file_name="metrics.prom",
+                           mime="text/plain", use_container_width=True)
+        c2.download_button("JSON", data=json.dumps(metrics_snapshot, indent=2), file_name="metrics.json",
+                           mime="application/json", use_container_width=True)
+        st.button("Reset metrics", on_click=metrics.reset, use_container_width=True)